@@ -27,6 +27,7 @@ import threading
 
 # Usage:
 # object_instance = create_object_in_qt_main_thread(Class, (data_1, data_2, ..., data_n))
+# object_instances = create_objects_in_qt_main_thread([(Class_1, (data_1, ...)), ..., (Class_n, (data_1, ...))])
 
 def create_object_in_qt_main_thread(cls, data):
     oc = ObjectCreator(cls, data)
@@ -34,6 +35,17 @@ def create_object_in_qt_main_thread(cls, data):
     oc.semaphore.acquire()
     return oc.obj
 
+# creates all objects with a single trip to the Qt main thread
+def create_objects_in_qt_main_thread(cls_and_data):
+    oc = ObjectsCreator(cls_and_data)
+    QtCore.QCoreApplication.instance().object_creator_signal.emit(oc)
+    oc.semaphore.acquire()
+
+    if oc.exception != None:
+        raise oc.exception
+
+    return oc.objs
+
 class ObjectCreator(object):
     def __init__(self, cls, data):
         self.cls = cls
@@ -44,3 +56,18 @@ class ObjectCreator(object):
     def create(self):
         self.obj = self.cls(*self.data)
         self.semaphore.release()
+
+class ObjectsCreator(object):
+    def __init__(self, cls_and_data):
+        self.cls_and_data = cls_and_data
+        self.semaphore = threading.Semaphore(0)
+        self.objs = None
+        self.exception = None
+
+    def create(self):
+        try:
+            self.objs = [cls(*data) for cls, data in self.cls_and_data]
+        except Exception as e:
+            self.exception = e
+        finally:
+            self.semaphore.release()
@@ -21,17 +21,39 @@ Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 Boston, MA 02111-1307, USA.
 """
 
-from collections import namedtuple
+from collections import namedtuple, deque
+import array
 import functools
+from operator import attrgetter
+import types
 import weakref
 import threading
 import time
 from brickv.bindings.ip_connection import Error
 from PyQt4 import QtCore
 from brickv.bindings.brick_red import BrickRED
-from brickv.object_creator import create_object_in_qt_main_thread
+from brickv.object_creator import create_object_in_qt_main_thread, create_objects_in_qt_main_thread
 from brickv.utils import get_main_window
 
+try:
+    from weakref import WeakMethod
+except ImportError:
+    # Python 2 fallback. only the target is weakly referenced, the function is
+    # owned by the class anyway
+    class WeakMethod(object):
+        def __init__(self, method):
+            self._target_ref = weakref.ref(method.__self__)
+            self._function   = method.__func__
+
+        def __call__(self):
+            target = self._target_ref()
+
+            if target is None:
+                return None
+
+            return types.MethodType(self._function, target)
+
+
 class REDError(Exception):
     E_SUCCESS                  = 0
     E_UNKNOWN_ERROR            = 1
@@ -114,79 +136,123 @@ class REDError(Exception):
     def error_code(self): return self._error_code
 
 
-class MethodRef(object):
-    def __init__(self, method):
-        self.target_ref   = weakref.ref(method.__self__)
-        self.function_ref = weakref.ref(method.__func__)
-
-    def get(self):
-        return self.target_ref(), self.function_ref()
-
-
 class REDBrick(BrickRED):
     def __init__(self, uid, *args):
         BrickRED.__init__(self, uid, *args)
 
         self._uid_str               = uid
-        self._active_callbacks      = {}
-        self._active_callbacks_lock = threading.Lock()
+        self._object_callbacks      = {} # callback_id -> object_id -> ((cookie, callback), ...)
+        self._object_callbacks_lock = threading.Lock()
         self._next_cookie           = 1
 
-    def _dispatch_callback(self, callback_id, *args, **kwargs):
-        active_callbacks = self._active_callbacks[callback_id]
-        dead_callbacks   = []
+    # the callback tuples are never modified, but replaced under the lock. this
+    # allows to iterate them during dispatch without copying them first
+    def _call_callbacks(self, callbacks, *args, **kwargs):
+        dead_cookies = []
 
-        for cookie in list(active_callbacks.keys()):
-            try:
-                callback_target, callback_function = active_callbacks[cookie].get()
-            except KeyError:
-                continue
+        for cookie, callback_ref in callbacks:
+            callback_function = callback_ref()
 
-            if callback_target != None and callback_function != None:
+            if callback_function is not None:
                 try:
-                    callback_function(callback_target, *args, **kwargs)
+                    callback_function(*args, **kwargs)
                 except:
                     pass
             else:
-                dead_callbacks.append(cookie)
+                dead_cookies.append(cookie)
 
-        if len(dead_callbacks) > 0:
-            with self._active_callbacks_lock:
-                for cookie in dead_callbacks:
-                    del active_callbacks[cookie]
+        return dead_cookies
 
-    def add_callback(self, callback_id, callback_function):
-        with self._active_callbacks_lock:
+    # routes the callback only to the callbacks added for the object ID given
+    # as first callback argument, instead of calling every added callback
+    def _dispatch_object_callback(self, callback_id, object_id, *args, **kwargs):
+        with self._object_callbacks_lock:
+            object_callbacks = self._object_callbacks.get(callback_id, {}).get(object_id, ())
+
+        for cookie in self._call_callbacks(object_callbacks, object_id, *args, **kwargs):
+            self.remove_object_callback(callback_id, object_id, cookie)
+
+    def add_object_callback(self, callback_id, object_id, callback_function):
+        with self._object_callbacks_lock:
             cookie             = self._next_cookie
             self._next_cookie += 1
 
-            if callback_id in self._active_callbacks:
-                self._active_callbacks[callback_id][cookie] = MethodRef(callback_function)
-            else:
-                self._active_callbacks[callback_id] = {cookie: MethodRef(callback_function)}
+            if callback_id not in self._object_callbacks:
+                self._object_callbacks[callback_id] = {}
 
-                self.register_callback(callback_id, functools.partial(self._dispatch_callback, callback_id))
+                self.register_callback(callback_id, functools.partial(self._dispatch_object_callback, callback_id))
+
+            object_callbacks            = self._object_callbacks[callback_id]
+            object_callbacks[object_id] = object_callbacks.get(object_id, ()) + ((cookie, WeakMethod(callback_function)),)
 
             return cookie
 
-    def remove_callback(self, callback_id, cookie):
-        with self._active_callbacks_lock:
-            if callback_id not in self._active_callbacks or \
-               cookie not in self._active_callbacks[callback_id]:
-                return
+    def remove_object_callback(self, callback_id, object_id, cookie):
+        with self._object_callbacks_lock:
+            object_callbacks = self._object_callbacks.get(callback_id, {})
+            callbacks        = tuple(entry for entry in object_callbacks.get(object_id, ()) if entry[0] != cookie)
 
-            del self._active_callbacks[callback_id][cookie]
+            if len(callbacks) > 0:
+                object_callbacks[object_id] = callbacks
+            else:
+                object_callbacks.pop(object_id, None)
 
     def remove_all_callbacks(self):
         self.registered_callbacks = {}
 
-        with self._active_callbacks_lock:
-            self._active_callbacks = {}
+        with self._object_callbacks_lock:
+            self._object_callbacks = {}
+
+
+# armed REDSessionExpirers are kept alive here instead of by their REDSession.
+# otherwise the expirer and its weakref would be part of the same garbage as the
+# session and the weakref callback would not be called when the garbage
+# collector breaks a reference cycle containing the session
+_armed_session_expirers = set()
+
+# expires the session when its REDSession gets garbage collected without being
+# expired explicitly. REDSession has no __del__ method for this, because that
+# would stop the garbage collector from collecting reference cycles containing
+# the session. while the keep-alive timer is running it references the session,
+# so this only catches sessions that stopped their keep-alive calls after being
+# lost. all other sessions have to be expired explicitly
+class REDSessionExpirer(object):
+    def __init__(self, session, brick, session_id, increase_error_count):
+        self._session_ref          = weakref.ref(session, self.expire)
+        self._brick                = brick
+        self._session_id           = session_id
+        self._increase_error_count = increase_error_count
+        self.armed                 = True
+
+        _armed_session_expirers.add(self)
+
+    def disarm(self):
+        self.armed = False
+
+        _armed_session_expirers.discard(self)
+
+    def expire(self, ref):
+        if not self.armed:
+            return
+
+        self.disarm()
+
+        try:
+            self._brick.expire_session_unchecked(self._session_id)
+        except:
+            # just report IPConnection-level error, but don't re-raise it
+            self._increase_error_count()
 
 
 class REDSession(QtCore.QObject):
-    KEEP_ALIVE_INTERVAL = 5 # seconds
     LIFETIME            = 60 # seconds
+    # other calls don't extend the lifetime of the session on the RED Brick, so
+    # keep-alive calls are required even while the session is in use. derive
+    # the interval from the lifetime so that the session gets lost only after
+    # four keep-alive calls in a row failed
+    KEEP_ALIVE_INTERVAL = LIFETIME / 6 # seconds
+    # number of recently used strings kept alive for reuse by the string cache
+    RECENT_STRINGS      = 64
 
     _qtcb_lost = QtCore.pyqtSignal(str)
 
@@ -197,13 +263,13 @@ class REDSession(QtCore.QObject):
 
         self._brick               = brick
         self._session_id          = None
+        self._expirer             = None
         self._keep_alive_timer    = None
         self._last_keep_alive     = 0
+        self._string_cache        = weakref.WeakValueDictionary() # unicode -> REDString
+        self._recent_strings      = deque(maxlen=REDSession.RECENT_STRINGS)
         self.increase_error_count = increase_error_count
 
-    def __del__(self):
-        self.expire()
-
     def __repr__(self):
         return '<REDSession session_id: {0}>'.format(self._session_id)
 
@@ -240,7 +306,10 @@ class REDSession(QtCore.QObject):
         if error_code != REDError.E_SUCCESS:
             raise REDError('Could not create session', error_code)
 
-        self._session_id = session_id
+        self._session_id     = session_id
+        self._string_cache   = weakref.WeakValueDictionary()
+        self._recent_strings = deque(maxlen=REDSession.RECENT_STRINGS)
+        self._expirer        = REDSessionExpirer(self, self._brick, session_id, self.increase_error_count)
 
         self._keep_alive_timer = threading.Timer(REDSession.KEEP_ALIVE_INTERVAL,
                                                  self._keep_session_alive)
@@ -260,6 +329,9 @@ class REDSession(QtCore.QObject):
         # ensure to remove references to REDObject via their added callback methods
         self._brick.remove_all_callbacks()
 
+        self._expirer.disarm()
+        self._expirer = None
+
         session_id       = self._session_id
         self._session_id = None
 
@@ -273,7 +345,7 @@ class REDSession(QtCore.QObject):
     def session_id(self): return self._session_id
 
 
-def _attach_or_release(session, object_class, object_id, extra_object_ids_to_release_on_error=None, extra_parameters=None):
+def _attach_or_release(session, object_class, object_id, extra_object_ids_to_release_on_error=None, extra_parameters=None, update=True):
     if extra_object_ids_to_release_on_error == None:
         extra_object_ids_to_release_on_error = []
 
@@ -283,24 +355,45 @@ def _attach_or_release(session, object_class, object_id, extra_object_ids_to_rel
         parameters += extra_parameters
 
     try:
-        obj = create_object_in_qt_main_thread(object_class, parameters).attach(object_id)
+        obj = create_object_in_qt_main_thread(object_class, parameters).attach(object_id, update)
+    except:
+        _release_unchecked(session, [object_id] + extra_object_ids_to_release_on_error)
+
+        raise # just re-raise the original exception
+
+    return obj
+
+
+# same as _attach_or_release for a list of (object_class, object_id) pairs, but
+# creates all objects with a single trip to the Qt main thread
+def _attach_or_release_many(session, object_classes_and_ids):
+    object_ids = [object_id for _, object_id in object_classes_and_ids]
+
+    try:
+        objs = create_objects_in_qt_main_thread([(object_class, (session,)) for object_class, _ in object_classes_and_ids])
     except:
+        _release_unchecked(session, object_ids)
+
+        raise # just re-raise the original exception
+
+    for i, obj in enumerate(objs):
         try:
-            session._brick.release_object_unchecked(object_id, session._session_id)
+            objs[i] = obj.attach(object_ids[i])
         except:
-            # just report IPConnection-level error, but don't re-raise it
-            session.increase_error_count()
+            _release_unchecked(session, object_ids[i:])
 
-        for extra_object_id in extra_object_ids_to_release_on_error:
-            try:
-                session._brick.release_object_unchecked(extra_object_id, session._session_id)
-            except:
-                # just report IPConnection-level error, but don't re-raise it
-                session.increase_error_count()
+            raise # just re-raise the original exception
 
-        raise # just re-raise the original exception
+    return objs
 
-    return obj
+
+def _release_unchecked(session, object_ids):
+    for object_id in object_ids:
+        try:
+            session._brick.release_object_unchecked(object_id, session._session_id)
+        except:
+            # just report IPConnection-level error, but don't re-raise it
+            session.increase_error_count()
 
 
 class REDObjectReleaser(object):
@@ -331,7 +424,7 @@ class REDObject(QtCore.QObject):
     TYPE_PROCESS   = BrickRED.OBJECT_TYPE_PROCESS
     TYPE_PROGRAM   = BrickRED.OBJECT_TYPE_PROGRAM
 
-    _subclasses = {}
+    _subclasses = () # indexed by object type
 
     def __init__(self, session):
         QtCore.QObject.__init__(self)
@@ -435,41 +528,72 @@ class REDString(REDObject):
         if self.object_id is None:
             raise RuntimeError('Cannot update unattached string object')
 
+        brick     = self._session._brick
+        object_id = self.object_id
+
+        # most strings (e.g. file names) fit into the first chunk. get it before
+        # the length, the bindings cut off the zero padding of a chunk, so a chunk
+        # shorter than the maximum contains the whole string and the length
+        # doesn't need to be requested at all
+        try:
+            error_code, chunk = brick.get_string_chunk(object_id, 0)
+        except Error:
+            self._session.increase_error_count()
+            raise
+
+        if error_code == REDError.E_OUT_OF_RANGE:
+            # an empty string has no chunk at offset 0
+            chunk = b''
+        elif error_code != REDError.E_SUCCESS:
+            raise REDError('Could not get chunk of string object {0} at offset {1}'.format(object_id, 0), error_code)
+
+        if len(chunk) < REDString.MAX_GET_CHUNK_BUFFER_LENGTH:
+            self._data = chunk.decode('utf-8')
+            return
+
         try:
-            error_code, length = self._session._brick.get_string_length(self.object_id)
+            error_code, length = brick.get_string_length(object_id)
         except Error:
             self._session.increase_error_count()
             raise
 
         if error_code != REDError.E_SUCCESS:
-            raise REDError('Could not get length of string object {0}'.format(self.object_id), error_code)
+            raise REDError('Could not get length of string object {0}'.format(object_id), error_code)
 
-        data_utf8 = ''
+        # copy the chunks into a preallocated buffer instead of concatenating them
+        offset             = min(len(chunk), length)
+        data_utf8          = bytearray(length)
+        data_utf8[:offset] = chunk[:offset]
 
-        while len(data_utf8) < length:
+        while offset < length:
             try:
-                error_code, chunk = self._session._brick.get_string_chunk(self.object_id, len(data_utf8))
+                error_code, chunk = brick.get_string_chunk(object_id, offset)
             except Error:
                 self._session.increase_error_count()
                 raise
 
             if error_code != REDError.E_SUCCESS:
-                raise REDError('Could not get chunk of string object {0} at offset {1}'.format(self.object_id, len(data_utf8)), error_code)
+                raise REDError('Could not get chunk of string object {0} at offset {1}'.format(object_id, offset), error_code)
+
+            chunk_length = min(len(chunk), length - offset)
 
-            data_utf8 += chunk
+            data_utf8[offset:offset + chunk_length] = chunk[:chunk_length]
+            offset += chunk_length
 
         self._data = data_utf8.decode('utf-8')
 
     def allocate(self, data):
         self.release()
 
-        data_unicode   = unicode(data)
-        data_utf8      = data_unicode.encode('utf-8')
-        chunk          = data_utf8[:REDString.MAX_ALLOCATE_BUFFER_LENGTH]
-        remaining_data = data_utf8[REDString.MAX_ALLOCATE_BUFFER_LENGTH:]
+        brick      = self._session._brick
+        session_id = self._session._session_id
+
+        data_unicode = unicode(data)
+        data_utf8    = data_unicode.encode('utf-8')
+        chunk        = data_utf8[:REDString.MAX_ALLOCATE_BUFFER_LENGTH]
 
         try:
-            error_code, object_id = self._session._brick.allocate_string(len(data_utf8), chunk, self._session._session_id)
+            error_code, object_id = brick.allocate_string(len(data_utf8), chunk, session_id)
         except Error:
             self._session.increase_error_count()
             raise
@@ -481,18 +605,19 @@ class REDString(REDObject):
 
         offset = len(chunk)
 
-        while len(remaining_data) > 0:
-            chunk          = remaining_data[:REDString.MAX_SET_CHUNK_BUFFER_LENGTH]
-            remaining_data = remaining_data[REDString.MAX_SET_CHUNK_BUFFER_LENGTH:]
+        # index into data_utf8 instead of slicing off the remaining data each
+        # time, that would copy the whole remaining data for every chunk
+        while offset < len(data_utf8):
+            chunk = data_utf8[offset:offset + REDString.MAX_SET_CHUNK_BUFFER_LENGTH]
 
             try:
-                error_code = self._session._brick.set_string_chunk(self.object_id, offset, chunk)
+                error_code = brick.set_string_chunk(object_id, offset, chunk)
             except Error:
                 self._session.increase_error_count()
                 raise
 
             if error_code != REDError.E_SUCCESS:
-                raise REDError('Could not set chunk of string object {0} at offset {1}'.format(self.object_id, offset), error_code)
+                raise REDError('Could not set chunk of string object {0} at offset {1}'.format(object_id, offset), error_code)
 
             offset += len(chunk)
 
@@ -504,6 +629,40 @@ class REDString(REDObject):
     def data(self): return self._data
 
 
+# returns a REDString with the given data, reusing a string object of the
+# session that has the same data and is still in use or was used recently,
+# instead of allocating another one on the RED Brick. the returned string is
+# shared, don't release or reallocate it
+def _get_cached_red_string(session, data):
+    if isinstance(data, REDString):
+        return data
+
+    data_unicode = unicode(data)
+    red_string   = session._string_cache.get(data_unicode)
+
+    if red_string is None or red_string.object_id is None or red_string._data != data_unicode:
+        red_string = REDString(session).allocate(data_unicode)
+        session._string_cache[data_unicode] = red_string
+
+    # keep recently used strings alive, so that strings used over and over
+    # again, e.g. the same file name, are not allocated for every use
+    session._recent_strings.append(red_string)
+
+    return red_string
+
+
+# returns the REDString for the given data and its object ID, or None and 0 if
+# the string is not used, e.g. the file name for a non-file stdio redirection or
+# the start fields for a non-cron schedule
+def _get_optional_red_string(session, used, data):
+    if not used:
+        return None, 0
+
+    red_string = _get_cached_red_string(session, data)
+
+    return red_string, red_string.object_id
+
+
 def _red_string_to_unicode(red_string):
     if red_string != None:
         return unicode(red_string)
@@ -511,6 +670,27 @@ def _red_string_to_unicode(red_string):
         return None
 
 
+# allocates REDString and REDList objects for all given values that are not
+# REDObjects yet. strings are allocated through the string cache of the
+# session, all objects stay referenced until the whole batch is allocated. this
+# way strings repeated between the values, e.g. the executable path in the
+# arguments or the working directory in the environment, are allocated once
+def _allocate_batch(session, values):
+    objs = []
+
+    for value in values:
+        if isinstance(value, REDObject):
+            obj = value
+        elif isinstance(value, (str, unicode)):
+            obj = _get_cached_red_string(session, value)
+        else:
+            obj = REDList(session).allocate(value)
+
+        objs.append(obj)
+
+    return objs
+
+
 class REDList(REDObject):
     def __repr__(self):
         return '<REDList object_id: {0}>'.format(self.object_id)
@@ -532,44 +712,62 @@ class REDList(REDObject):
     def update(self):
         if self.object_id is None:
             raise RuntimeError('Cannot update unattached list object')
+
+        brick      = self._session._brick
+        session_id = self._session._session_id
+        object_id  = self.object_id
+
         try:
-            error_code, length = self._session._brick.get_list_length(self.object_id)
+            error_code, length = brick.get_list_length(object_id)
         except Error:
             self._session.increase_error_count()
             raise
 
         if error_code != REDError.E_SUCCESS:
-            raise REDError('Could not get length of list object {0}'.format(self.object_id), error_code)
+            raise REDError('Could not get length of list object {0}'.format(object_id), error_code)
 
-        items = []
+        # get all items first and then attach them all at once. this creates all
+        # item objects with a single trip to the Qt main thread, instead of one
+        # trip per item
+        wrapper_classes_and_ids = []
 
-        for i in range(length):
-            try:
-                error_code, item_object_id, type_ = self._session._brick.get_list_item(self.object_id, i, self._session._session_id)
-            except Error:
-                self._session.increase_error_count()
-                raise
+        try:
+            for i in range(length):
+                try:
+                    error_code, item_object_id, type_ = brick.get_list_item(object_id, i, session_id)
+                except Error:
+                    self._session.increase_error_count()
+                    raise
 
-            if error_code != REDError.E_SUCCESS:
-                raise REDError('Could not get item at index {0} of list object {1}'.format(i, self.object_id), error_code)
+                if error_code != REDError.E_SUCCESS:
+                    raise REDError('Could not get item at index {0} of list object {1}'.format(i, object_id), error_code)
 
-            if self._forced_wrapper_class != None:
-                wrapper_class = self._forced_wrapper_class
-            else:
-                try:
-                    wrapper_class = REDObject._subclasses[type_]
-                except KeyError:
-                    raise TypeError('List object {0} contains item with unknown type {1} at index {2}'.format(self.object_id, type_, i))
+                if self._forced_wrapper_class != None:
+                    wrapper_class = self._forced_wrapper_class
+                else:
+                    try:
+                        wrapper_class = REDObject._subclasses[type_]
+                    except IndexError:
+                        _release_unchecked(self._session, [item_object_id])
 
-            items.append(_attach_or_release(self._session, wrapper_class, item_object_id))
+                        raise TypeError('List object {0} contains item with unknown type {1} at index {2}'.format(object_id, type_, i))
 
-        self._items = items
+                wrapper_classes_and_ids.append((wrapper_class, item_object_id))
+        except:
+            _release_unchecked(self._session, [item_object_id for _, item_object_id in wrapper_classes_and_ids])
+
+            raise # just re-raise the original exception
+
+        self._items = _attach_or_release_many(self._session, wrapper_classes_and_ids)
 
     def allocate(self, items):
         self.release()
 
+        brick      = self._session._brick
+        session_id = self._session._session_id
+
         try:
-            error_code, object_id = self._session._brick.allocate_list(len(items), self._session._session_id)
+            error_code, object_id = brick.allocate_list(len(items), session_id)
         except Error:
             self._session.increase_error_count()
             raise
@@ -579,22 +777,29 @@ class REDList(REDObject):
 
         self.attach(object_id, False)
 
+        # keep the string items as REDString objects. the string cache only
+        # holds weak references, this keeps them reusable for repeated strings
+        # in this list and for later allocations while the list is alive
+        allocated_items = []
+
         for item in items:
-            if isinstance(item, str) or isinstance(item, unicode):
-                item = REDString(self._session).allocate(item)
+            if isinstance(item, (str, unicode)):
+                item = _get_cached_red_string(self._session, item)
             elif not isinstance(item, REDObject):
-                raise TypeError('Cannot append {0} item to list object {1}'.format(type(item), self.object_id))
+                raise TypeError('Cannot append {0} item to list object {1}'.format(type(item), object_id))
+
+            allocated_items.append(item)
 
             try:
-                error_code = self._session._brick.append_to_list(self.object_id, item.object_id)
+                error_code = brick.append_to_list(object_id, item.object_id)
             except Error:
                 self._session.increase_error_count()
                 raise
 
             if error_code != REDError.E_SUCCESS:
-                raise REDError('Could not append item {0} to list object {1}'.format(item.object_id, self.object_id), error_code)
+                raise REDError('Could not append item {0} to list object {1}'.format(item.object_id, object_id), error_code)
 
-        self._items = items
+        self._items = allocated_items
 
         return self
 
@@ -611,14 +816,68 @@ class REDList(REDObject):
         return items
 
 
-def _get_zero_padded_chunk(data, max_chunk_length, start = 0):
-    chunk        = data[start:start + max_chunk_length]
-    chunk_length = len(chunk)
-    chunk       += b'\0'*(max_chunk_length - chunk_length)
+# copies the next chunk of data into the given reusable chunk buffer, instead
+# of slicing and padding a new chunk each time. the length of the chunk buffer
+# is the maximum chunk length and must not exceed the length of _zero_padding
+def _get_zero_padded_chunk(chunk, data, start = 0):
+    max_chunk_length = len(chunk)
+    chunk_length     = min(max_chunk_length, len(data) - start)
+
+    chunk[:chunk_length] = data[start:start + chunk_length]
+
+    if chunk_length < max_chunk_length:
+        chunk[chunk_length:] = _zero_padding[:max_chunk_length - chunk_length]
 
     return chunk, chunk_length
 
 
+# pool of reusable read buffers, grouped by power-of-two size classes. this
+# avoids allocating and freeing big buffers over and over again for repeated
+# reads of similar size, e.g. while downloading a file in fixed size parts
+class _BufferPool(object):
+    MAX_BUFFERS_PER_SIZE_CLASS = 2
+
+    def __init__(self):
+        self._size_classes = {}
+        self._lock         = threading.Lock()
+
+    def _get_size_class(self, length):
+        return 1 << max(length - 1, 0).bit_length()
+
+    def get(self, length):
+        with self._lock:
+            buffers = self._size_classes.get(self._get_size_class(length))
+
+            if buffers:
+                return buffers.pop()
+
+        return bytearray(length)
+
+    # the buffer can have any length, ReadAsyncData fills it from the start
+    # and appends if it's too short
+    def put(self, buffer):
+        with self._lock:
+            buffers = self._size_classes.setdefault(self._get_size_class(len(buffer)), [])
+
+            if len(buffers) < _BufferPool.MAX_BUFFERS_PER_SIZE_CLASS:
+                buffers.append(buffer)
+
+    def clear(self):
+        with self._lock:
+            self._size_classes = {}
+
+
+# returns a read-only view of the data to be written. bytes, bytearray and
+# memoryview data is used as is instead of copying it, other iterables (e.g.
+# lists of single-char strings) are copied into a bytearray. the caller must
+# not modify a mutable buffer while it's being written
+def _get_write_data_view(data):
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytearray(data)
+
+    return memoryview(data)
+
+
 class REDFileBase(REDObject):
     class WriteAsyncData(QtCore.QObject):
         _qtcb_result = QtCore.pyqtSignal(object)
@@ -631,6 +890,8 @@ class REDFileBase(REDObject):
             self.length  = len(data)
             self.written = 0
             self.abort   = False
+            self.error   = None
+            self.done    = None # threading.Event, only set for synchronous writes
 
             if result_callback != None:
                 self._qtcb_result.connect(result_callback, QtCore.Qt.QueuedConnection)
@@ -642,14 +903,25 @@ class REDFileBase(REDObject):
         _qtcb_result = QtCore.pyqtSignal(object)
         _qtcb_status = QtCore.pyqtSignal(int, int)
 
-        def __init__(self, max_length, result_callback, status_callback):
+        def __init__(self, max_length, result_callback, status_callback, use_buffer_pool=False):
             QtCore.QObject.__init__(self)
 
             self.max_length   = max_length
             self.burst_length = 0
             self.data_length  = 0
-            self.data_chunks  = []
+
+            # the buffer is truncated to data_length on completion. callers that
+            # hand it back via recycle_read_buffer opt into the buffer pool.
+            # otherwise max_length is only an upper bound, so start with at most
+            # one burst worth of buffer and let it grow as data arrives
+            if use_buffer_pool:
+                self.data = REDFileBase._read_buffer_pool.get(max_length)
+            else:
+                self.data = bytearray(min(max_length, REDFileBase.ASYNC_READ_BURST_LENGTH))
+
             self.abort        = False
+            self.result       = None
+            self.done         = None # threading.Event, only set for synchronous reads
 
             if result_callback != None:
                 self._qtcb_result.connect(result_callback, QtCore.Qt.QueuedConnection)
@@ -686,6 +958,19 @@ class REDFileBase(REDObject):
 
     _qtcb_events_occurred = QtCore.pyqtSignal(int)
 
+    _read_buffer_pool = _BufferPool()
+
+    # hand back the data of an AsyncReadResult of a read_async call with
+    # use_buffer_pool set for reuse by later reads, once it's not used anymore
+    @staticmethod
+    def recycle_read_buffer(data):
+        REDFileBase._read_buffer_pool.put(data)
+
+    # drop all read buffers kept for reuse
+    @staticmethod
+    def release_unused_read_buffers():
+        REDFileBase._read_buffer_pool.clear()
+
     def _initialize(self):
         self._type               = None
         self._name               = None
@@ -707,25 +992,37 @@ class REDFileBase(REDObject):
         self._write_async_data = None
         self._read_async_data  = None
 
+        # reused for every chunk, the bindings copy the chunk into the packet
+        # before the write call returns
+        self._write_unchecked_chunk = bytearray(REDFileBase.MAX_WRITE_UNCHECKED_BUFFER_LENGTH)
+        self._write_async_chunk     = bytearray(REDFileBase.MAX_WRITE_ASYNC_BUFFER_LENGTH)
+        self._write_chunk           = bytearray(REDFileBase.MAX_WRITE_BUFFER_LENGTH)
+
     def _attach_callbacks(self):
         self._qtcb_events_occurred.connect(self._cb_events_occurred, QtCore.Qt.QueuedConnection)
 
-        self._cb_async_write_cookie     = self._session._brick.add_callback(REDBrick.CALLBACK_ASYNC_FILE_WRITE,
-                                                                            self._cb_async_write)
-        self._cb_async_read_cookie      = self._session._brick.add_callback(REDBrick.CALLBACK_ASYNC_FILE_READ,
-                                                                            self._cb_async_read)
-        self._cb_events_occurred_cookie = self._session._brick.add_callback(REDBrick.CALLBACK_FILE_EVENTS_OCCURRED,
-                                                                            self._cb_events_occurred_emit)
+        self._cb_async_write_cookie     = self._session._brick.add_object_callback(REDBrick.CALLBACK_ASYNC_FILE_WRITE,
+                                                                                   self.object_id,
+                                                                                   self._cb_async_write)
+        self._cb_async_read_cookie      = self._session._brick.add_object_callback(REDBrick.CALLBACK_ASYNC_FILE_READ,
+                                                                                   self.object_id,
+                                                                                   self._cb_async_read)
+        self._cb_events_occurred_cookie = self._session._brick.add_object_callback(REDBrick.CALLBACK_FILE_EVENTS_OCCURRED,
+                                                                                   self.object_id,
+                                                                                   self._cb_events_occurred_emit)
 
     def _detach_callbacks(self):
         self._qtcb_events_occurred.disconnect(self._cb_events_occurred)
 
-        self._session._brick.remove_callback(REDBrick.CALLBACK_ASYNC_FILE_WRITE,
-                                             self._cb_async_write_cookie)
-        self._session._brick.remove_callback(REDBrick.CALLBACK_ASYNC_FILE_READ,
-                                             self._cb_async_read_cookie)
-        self._session._brick.remove_callback(REDBrick.CALLBACK_FILE_EVENTS_OCCURRED,
-                                             self._cb_events_occurred_cookie)
+        self._session._brick.remove_object_callback(REDBrick.CALLBACK_ASYNC_FILE_WRITE,
+                                                    self.object_id,
+                                                    self._cb_async_write_cookie)
+        self._session._brick.remove_object_callback(REDBrick.CALLBACK_ASYNC_FILE_READ,
+                                                    self.object_id,
+                                                    self._cb_async_read_cookie)
+        self._session._brick.remove_object_callback(REDBrick.CALLBACK_FILE_EVENTS_OCCURRED,
+                                                    self.object_id,
+                                                    self._cb_events_occurred_cookie)
 
         self._cb_async_write_cookie     = None
         self._cb_async_read_cookie      = None
@@ -738,13 +1035,16 @@ class REDFileBase(REDObject):
         if error != None and isinstance(error, Error):
             self._session.increase_error_count()
 
-        self._write_async_data._qtcb_result.emit(error)
+        write_async_data       = self._write_async_data
         self._write_async_data = None
 
-    def _cb_async_write(self, file_id, error_code, length_written):
-        if self.object_id != file_id:
-            return
+        write_async_data.error = error
+        write_async_data._qtcb_result.emit(error)
 
+        if write_async_data.done != None:
+            write_async_data.done.set()
+
+    def _cb_async_write(self, file_id, error_code, length_written):
         if self._write_async_data == None:
             return
 
@@ -769,31 +1069,41 @@ class REDFileBase(REDObject):
             self._report_write_async_result(REDError('Could not write to file object {0}'.format(self.object_id), REDError.E_OPERATION_ABORTED))
             return
 
-        unchecked_writes = 0
-
-        # do at most ASYNC_BURST_CHUNKS - 1 unchecked writes before the final async write per burst
-        while unchecked_writes < REDFileBase.ASYNC_BURST_CHUNKS - 1 and \
-              (self._write_async_data.length - self._write_async_data.written) > REDFileBase.MAX_WRITE_ASYNC_BUFFER_LENGTH:
-            chunk, length_to_write = _get_zero_padded_chunk(self._write_async_data.data,
-                                                            REDFileBase.MAX_WRITE_UNCHECKED_BUFFER_LENGTH,
-                                                            self._write_async_data.written)
+        write_async_data = self._write_async_data
+        object_id        = self.object_id
+        data             = write_async_data.data
+        written          = write_async_data.written
+        chunk            = self._write_unchecked_chunk
+        chunk_length     = REDFileBase.MAX_WRITE_UNCHECKED_BUFFER_LENGTH
+        write_unchecked  = self._session._brick.write_file_unchecked
+
+        # do at most ASYNC_BURST_CHUNKS - 1 unchecked writes before the final async
+        # write per burst, but leave more than MAX_WRITE_ASYNC_BUFFER_LENGTH bytes
+        # for the final async write. because MAX_WRITE_ASYNC_BUFFER_LENGTH is not
+        # smaller than MAX_WRITE_UNCHECKED_BUFFER_LENGTH all unchecked writes are
+        # full chunks that need no padding
+        unchecked_writes = min(REDFileBase.ASYNC_BURST_CHUNKS - 1,
+                               max(write_async_data.length - written - REDFileBase.MAX_WRITE_ASYNC_BUFFER_LENGTH + chunk_length - 1, 0) // chunk_length)
+
+        for _ in range(unchecked_writes):
+            chunk[:] = data[written:written + chunk_length]
 
             try:
-                self._session._brick.write_file_unchecked(self.object_id, chunk, length_to_write)
+                write_unchecked(object_id, chunk, chunk_length)
             except Exception as e:
+                write_async_data.written = written
                 self._report_write_async_result(e)
                 return
 
-            self._write_async_data.written += length_to_write
-            unchecked_writes               += 1
+            written += chunk_length
+
+        write_async_data.written = written
 
-        chunk, length_to_write = _get_zero_padded_chunk(self._write_async_data.data,
-                                                        REDFileBase.MAX_WRITE_ASYNC_BUFFER_LENGTH,
-                                                        self._write_async_data.written)
+        chunk, length_to_write = _get_zero_padded_chunk(self._write_async_chunk, data, written)
 
         try:
             # FIXME: Do we need a timeout here for the case that no callback comes?
-            self._session._brick.write_file_async(self.object_id, chunk, length_to_write)
+            self._session._brick.write_file_async(object_id, chunk, length_to_write)
         except Exception as e:
             self._report_write_async_result(e)
 
@@ -804,15 +1114,20 @@ class REDFileBase(REDObject):
         if error != None and isinstance(error, Error):
             self._session.increase_error_count()
 
-        data = bytearray().join(self._read_async_data.data_chunks)
-
-        self._read_async_data._qtcb_result.emit(REDFileBase.AsyncReadResult(data, error))
+        read_async_data       = self._read_async_data
         self._read_async_data = None
 
-    def _cb_async_read(self, file_id, error_code, buf, length_read):
-        if self.object_id != file_id:
-            return
+        data = read_async_data.data
+
+        del data[read_async_data.data_length:]
+
+        read_async_data.result = REDFileBase.AsyncReadResult(data, error)
+        read_async_data._qtcb_result.emit(read_async_data.result)
 
+        if read_async_data.done != None:
+            read_async_data.done.set()
+
+    def _cb_async_read(self, file_id, error_code, buf, length_read):
         if self._read_async_data == None:
             return
 
@@ -828,11 +1143,16 @@ class REDFileBase(REDObject):
             self._report_read_async_result(None)
             return
 
+        # copy the chunk into the preallocated buffer at the current offset. the
+        # buffer can be shorter, then the chunk is appended to it
+        start       = self._read_async_data.data_length
+        length_read = min(length_read, self._read_async_data.max_length - start)
+
+        self._read_async_data.data[start:start + length_read] = buf[:length_read]
+
         self._read_async_data.burst_length += length_read
         self._read_async_data.data_length  += length_read
 
-        self._read_async_data.data_chunks.append(bytearray(buf[:length_read]))
-
         if self._read_async_data.data_length >= self._read_async_data.max_length:
             # read max_length data, report the result
             self._report_read_async_status()
@@ -858,9 +1178,6 @@ class REDFileBase(REDObject):
             self._report_read_async_result(e)
 
     def _cb_events_occurred_emit(self, file_id, events):
-        if self.object_id != file_id:
-            return
-
         # cannot directly use emit function as callback functions, because this
         # triggers a segfault on the second call for some unknown reason. adding
         # a method in between helps
@@ -886,6 +1203,11 @@ class REDFileBase(REDObject):
         if error_code != REDError.E_SUCCESS:
             raise REDError('Could not get information for file object {0}'.format(self.object_id), error_code)
 
+        self._set_file_info(type_, name_string_id, flags, permissions, uid, gid,
+                            length, access_time, modification_time, status_change_time)
+
+    def _set_file_info(self, type_, name_string_id, flags, permissions, uid, gid,
+                       length, access_time, modification_time, status_change_time):
         if type_ == REDFileBase.TYPE_PIPE:
             name = None
         else:
@@ -902,27 +1224,102 @@ class REDFileBase(REDObject):
         self._modification_time  = modification_time
         self._status_change_time = status_change_time
 
-    def write(self, data):
-        if self.object_id is None:
-            raise RuntimeError('Cannot write to unattached file object')
+    def _wait_for_async_done(self, async_data, get_progress):
+        timeout  = self._session._brick.ipcon.get_timeout()
+        progress = get_progress()
+
+        # the callbacks might never come if the connection is lost. give up if
+        # there was no progress for a whole IPConnection timeout period
+        while not async_data.done.wait(timeout):
+            if progress == get_progress():
+                self._session.increase_error_count()
+                return False
+
+            progress = get_progress()
+
+        return True
+
+    # data that fits into a single chunk is written with plain write_file calls.
+    # this avoids the setup and the callback round trip of the burst mechanism
+    # for the many small writes of config files and control strings. usually
+    # one call is enough, more are only needed if the RED Brick does a short write
+    def _write_single_chunk(self, data):
+        brick     = self._session._brick
+        object_id = self.object_id
+        written   = 0
+
+        while written < len(data):
+            chunk, length_to_write = _get_zero_padded_chunk(self._write_chunk, data, written)
+
+            try:
+                error_code, length_written = brick.write_file(object_id, chunk, length_to_write)
+            except Error:
+                self._session.increase_error_count()
+                raise
+
+            if error_code != REDError.E_SUCCESS:
+                # FIXME: recover seek position on error after successful call?
+                raise REDError('Could not write to file object {0}'.format(object_id), error_code)
 
-        remaining_data = bytearray(data)
+            written += length_written
 
-        while len(remaining_data) > 0:
-            chunk, length_to_write = _get_zero_padded_chunk(remaining_data,
-                                                            REDFileBase.MAX_WRITE_BUFFER_LENGTH)
+    # same as _write_single_chunk for reads that fit into a single chunk
+    def _read_single_chunk(self, length):
+        brick     = self._session._brick
+        object_id = self.object_id
+        data      = bytearray()
 
+        while len(data) < length:
             try:
-                error_code, length_written = self._session._brick.write_file(self.object_id, chunk, length_to_write)
+                error_code, chunk, length_read = brick.read_file(object_id, length - len(data))
             except Error:
                 self._session.increase_error_count()
                 raise
 
             if error_code != REDError.E_SUCCESS:
                 # FIXME: recover seek position on error after successful call?
-                raise REDError('Could not write to file object {0}'.format(self.object_id), error_code)
+                raise REDError('Could not read from file object {0}'.format(object_id), error_code)
+
+            if length_read == 0:
+                break
+
+            data += bytearray(chunk[:length_read])
+
+        return data
+
+    # blocks until the whole data is written. uses the same burst mechanism as
+    # write_async, but waits for its completion instead of reporting the result
+    # via a Qt signal. don't call this from the IPConnection callback thread
+    def write(self, data):
+        if self.object_id is None:
+            raise RuntimeError('Cannot write to unattached file object')
+
+        if self._write_async_data != None:
+            raise RuntimeError('Another asynchronous write is already in progress')
+
+        data = _get_write_data_view(data)
+
+        if len(data) == 0:
+            return
 
-            remaining_data = remaining_data[length_written:]
+        if len(data) <= REDFileBase.MAX_WRITE_BUFFER_LENGTH:
+            self._write_single_chunk(data)
+            return
+
+        write_async_data      = REDFileBase.WriteAsyncData(data, None, None)
+        write_async_data.done = threading.Event()
+
+        self._write_async_data = write_async_data
+        self._next_write_async_burst()
+
+        if not self._wait_for_async_done(write_async_data, lambda: write_async_data.written):
+            if self._write_async_data is write_async_data:
+                self._write_async_data = None
+
+            raise Error(Error.TIMEOUT, 'Did not receive write response in time for file object {0}'.format(self.object_id))
+
+        if write_async_data.error != None:
+            raise write_async_data.error
 
     def write_async(self, data, result_callback=None, status_callback=None):
         if self.object_id is None:
@@ -932,39 +1329,46 @@ class REDFileBase(REDObject):
             raise RuntimeError('Another asynchronous write is already in progress')
 
         self._write_async_data = create_object_in_qt_main_thread(REDFileBase.WriteAsyncData,
-                                                                 (bytearray(data), result_callback, status_callback))
+                                                                 (_get_write_data_view(data), result_callback, status_callback))
 
         self._report_write_async_status()
         self._next_write_async_burst()
 
+    # blocks until length bytes are read or the end of the file is reached.
+    # uses the same burst mechanism as read_async, but waits for its completion
+    # instead of reporting the result via a Qt signal. don't call this from the
+    # IPConnection callback thread
     def read(self, length):
         if self.object_id is None:
             raise RuntimeError('Cannot read from unattached file object')
 
-        data = bytearray()
+        if self._read_async_data != None:
+            raise RuntimeError('Another asynchronous read is already in progress')
 
-        while length > 0:
-            length_to_read = min(length, REDFileBase.MAX_READ_BUFFER_LENGTH)
+        if length <= 0:
+            return bytearray()
 
-            try:
-                error_code, chunk, length_read = self._session._brick.read_file(self.object_id, length_to_read)
-            except Error:
-                self._session.increase_error_count()
-                raise
+        if length <= REDFileBase.MAX_READ_BUFFER_LENGTH:
+            return self._read_single_chunk(length)
 
-            if error_code != REDError.E_SUCCESS:
-                # FIXME: recover seek position on error after successful call?
-                raise REDError('Could not read from file object {0}'.format(self.object_id), error_code)
+        read_async_data      = REDFileBase.ReadAsyncData(length, None, None)
+        read_async_data.done = threading.Event()
 
-            if length_read == 0:
-                break
+        self._read_async_data = read_async_data
+        self._next_read_async_burst()
 
-            data   += bytearray(chunk[:length_read])
-            length -= length_read
+        if not self._wait_for_async_done(read_async_data, lambda: read_async_data.data_length):
+            if self._read_async_data is read_async_data:
+                self._read_async_data = None
 
-        return data
+            raise Error(Error.TIMEOUT, 'Did not receive read response in time for file object {0}'.format(self.object_id))
+
+        if read_async_data.result.error != None:
+            raise read_async_data.result.error
+
+        return read_async_data.result.data
 
-    def read_async(self, max_length, result_callback, status_callback=None):
+    def read_async(self, max_length, result_callback, status_callback=None, use_buffer_pool=False):
         if self.object_id is None:
             raise RuntimeError('Cannot read from unattached file object')
 
@@ -972,7 +1376,7 @@ class REDFileBase(REDObject):
             raise RuntimeError('Another asynchronous read is already in progress')
 
         self._read_async_data = create_object_in_qt_main_thread(REDFileBase.ReadAsyncData,
-                                                                (max_length, result_callback, status_callback))
+                                                                (max_length, result_callback, status_callback, use_buffer_pool))
 
         self._report_read_async_status()
         self._next_read_async_burst()
@@ -1032,6 +1436,14 @@ class REDFileBase(REDObject):
     def status_change_time(self): return self._status_change_time
 
 
+# the packets have a fixed size, so a short chunk still has to be padded. the
+# padding is copied from this view instead of allocating new zeros each time.
+# it's long enough to pad every chunk buffer used by _get_zero_padded_chunk
+_zero_padding = memoryview(bytes(bytearray(max(REDFileBase.MAX_WRITE_BUFFER_LENGTH,
+                                               REDFileBase.MAX_WRITE_UNCHECKED_BUFFER_LENGTH,
+                                               REDFileBase.MAX_WRITE_ASYNC_BUFFER_LENGTH))))
+
+
 class REDFile(REDFileBase):
     FLAG_READ_ONLY    = BrickRED.FILE_FLAG_READ_ONLY
     FLAG_WRITE_ONLY   = BrickRED.FILE_FLAG_WRITE_ONLY
@@ -1050,8 +1462,7 @@ class REDFile(REDFileBase):
     def open(self, name, flags, permissions, uid, gid):
         self.release()
 
-        if not isinstance(name, REDString):
-            name = REDString(self._session).allocate(name)
+        name = _get_cached_red_string(self._session, name)
 
         try:
             error_code, object_id = self._session._brick.open_file(name.object_id, flags, permissions, uid, gid, self._session._session_id)
@@ -1113,27 +1524,27 @@ class REDFileOrPipeAttacher(REDObject):
         REDObject.attach(self, object_id, False)
 
         try:
-            error_code, type_, name_string_id, _, _, _, _, _, _, _, _ = self._session._brick.get_file_info(self.object_id, self._session._session_id)
+            file_info = self._session._brick.get_file_info(self.object_id, self._session._session_id)
         except Error:
             self._session.increase_error_count()
             raise
 
+        error_code, type_, name_string_id = file_info[:3]
+
         if error_code != REDError.E_SUCCESS:
             raise REDError('Could not get information for file object {0}'.format(self.object_id), error_code)
 
+        # hand the file information over to the file or pipe object, instead of
+        # releasing the name and letting the object get the information again
         if type_ == REDFileBase.TYPE_PIPE:
-            obj = _attach_or_release(self._session, REDPipe, self.object_id)
+            obj = _attach_or_release(self._session, REDPipe, self.object_id, update=False)
         else:
-            try:
-                self._session._brick.release_object_unchecked(name_string_id, self._session._session_id)
-            except:
-                # just report IPConnection-level error, but don't re-raise it
-                self._session.increase_error_count()
-
-            obj = _attach_or_release(self._session, REDFile, self.object_id)
+            obj = _attach_or_release(self._session, REDFile, self.object_id, [name_string_id], update=False)
 
         self.detach()
 
+        obj._set_file_info(*file_info[1:])
+
         return obj
 
 
@@ -1152,7 +1563,8 @@ class REDDirectory(REDObject):
 
     def _initialize(self):
         self._name    = None
-        self._entries = None
+        self._entry_names = None # REDString objects
+        self._entry_types = None # array of entry types, parallel to the names
 
     def _attach_callbacks(self):
         pass
@@ -1161,6 +1573,11 @@ class REDDirectory(REDObject):
         pass
 
     def update(self):
+        self._update(True)
+
+    # a just opened directory object is already at its first entry and doesn't
+    # need to be rewound
+    def _update(self, rewind):
         if self.object_id is None:
             raise RuntimeError('Cannot update unattached directory object')
 
@@ -1177,40 +1594,54 @@ class REDDirectory(REDObject):
         self._name = _attach_or_release(self._session, REDString, name_string_id)
 
         # rewind
-        try:
-            error_code = self._session._brick.rewind_directory(self.object_id)
-        except Error:
-            self._session.increase_error_count()
-            raise
-
-        if error_code != REDError.E_SUCCESS:
-            raise REDError('Could not rewind directory object {0}'.format(self.object_id), error_code)
-
-        # get entries
-        entries = []
-
-        while True:
+        if rewind:
             try:
-                error_code, name_string_id, type_ = self._session._brick.get_next_directory_entry(self.object_id, self._session._session_id)
+                error_code = self._session._brick.rewind_directory(self.object_id)
             except Error:
                 self._session.increase_error_count()
                 raise
 
-            if error_code == REDError.E_NO_MORE_DATA:
-                break
-
             if error_code != REDError.E_SUCCESS:
-                raise REDError('Could not get next entry of directory object {0}'.format(self.object_id), error_code)
+                raise REDError('Could not rewind directory object {0}'.format(self.object_id), error_code)
+
+        # get all entries first and then attach their names all at once, same
+        # as REDList.update does for its items
+        brick           = self._session._brick
+        session_id      = self._session._session_id
+        object_id       = self.object_id
+        name_string_ids = []
+        entry_types     = array.array('B')
+
+        try:
+            while True:
+                try:
+                    error_code, name_string_id, type_ = brick.get_next_directory_entry(object_id, session_id)
+                except Error:
+                    self._session.increase_error_count()
+                    raise
 
-            entries.append((_attach_or_release(self._session, REDString, name_string_id), type_))
+                if error_code == REDError.E_NO_MORE_DATA:
+                    break
 
-        self._entries = entries
+                if error_code != REDError.E_SUCCESS:
+                    raise REDError('Could not get next entry of directory object {0}'.format(object_id), error_code)
+
+                name_string_ids.append(name_string_id)
+                entry_types.append(type_)
+        except:
+            _release_unchecked(self._session, name_string_ids)
+
+            raise # just re-raise the original exception
+
+        names = _attach_or_release_many(self._session, [(REDString, name_string_id) for name_string_id in name_string_ids])
+
+        self._entry_names = names
+        self._entry_types = entry_types
 
     def open(self, name):
         self.release()
 
-        if not isinstance(name, REDString):
-            name = REDString(self._session).allocate(name)
+        name = _get_cached_red_string(self._session, name)
 
         try:
             error_code, object_id = self._session._brick.open_directory(name.object_id, self._session._session_id)
@@ -1221,22 +1652,22 @@ class REDDirectory(REDObject):
         if error_code != REDError.E_SUCCESS:
             raise REDError('Could not open directory object', error_code)
 
-        self.attach(object_id)
+        self.attach(object_id, False)
+        self._update(False)
 
         return self
 
     @property
     def name(self):    return _red_string_to_unicode(self._name)
     @property
-    def entries(self): return [unicode(entry) for entry in self._entries]
+    def entries(self): return [(unicode(name), type_) for name, type_ in zip(self._entry_names, self._entry_types)]
 
 
 DIRECTORY_FLAG_RECURSIVE = BrickRED.DIRECTORY_FLAG_RECURSIVE
 DIRECTORY_FLAG_EXCLUSIVE = BrickRED.DIRECTORY_FLAG_EXCLUSIVE
 
 def create_directory(session, name, flags, permissions, uid, gid):
-    if not isinstance(name, REDString):
-        name = REDString(session).allocate(name)
+    name = _get_cached_red_string(session, name)
 
     try:
         error_code = session._brick.create_directory(name.object_id, flags, permissions, uid, gid)
@@ -1297,20 +1728,20 @@ class REDProcess(REDObject):
 
     def _attach_callbacks(self):
         self._qtcb_state_changed.connect(self._cb_state_changed, QtCore.Qt.QueuedConnection)
-        self._cb_state_changed_emit_cookie = self._session._brick.add_callback(BrickRED.CALLBACK_PROCESS_STATE_CHANGED,
-                                                                               self._cb_state_changed_emit)
+        self._cb_state_changed_emit_cookie = self._session._brick.add_object_callback(BrickRED.CALLBACK_PROCESS_STATE_CHANGED,
+                                                                                      self.object_id,
+                                                                                      self._cb_state_changed_emit)
 
     def _detach_callbacks(self):
         self._qtcb_state_changed.disconnect(self._cb_state_changed)
-        self._session._brick.remove_callback(BrickRED.CALLBACK_PROCESS_STATE_CHANGED,
-                                             self._cb_state_changed_emit_cookie)
+        self._session._brick.remove_object_callback(BrickRED.CALLBACK_PROCESS_STATE_CHANGED,
+                                                    self.object_id,
+                                                    self._cb_state_changed_emit_cookie)
 
         self._cb_state_changed_emit_cookie = None
 
+    # only called for this process, REDBrick routes the callback by object ID
     def _cb_state_changed_emit(self, process_id, state, timestamp, exit_code):
-        if self.object_id != process_id:
-            return
-
         # cannot directly use emit function as callback functions, because this
         # triggers a segfault on the second call for some unknown reason. adding
         # a method in between helps
@@ -1357,10 +1788,11 @@ class REDProcess(REDObject):
         if error_code != REDError.E_SUCCESS:
             raise REDError('Could not get command of process object {0}'.format(self.object_id), error_code)
 
-        executable        = _attach_or_release(self._session, REDString, executable_string_id, [arguments_list_id, environment_list_id, working_directory_string_id])
-        arguments         = _attach_or_release(self._session, REDList, arguments_list_id, [environment_list_id, working_directory_string_id])
-        environment       = _attach_or_release(self._session, REDList, environment_list_id, [working_directory_string_id])
-        working_directory = _attach_or_release(self._session, REDString, working_directory_string_id)
+        executable, arguments, environment, working_directory = \
+            _attach_or_release_many(self._session, [(REDString, executable_string_id),
+                                                    (REDList, arguments_list_id),
+                                                    (REDList, environment_list_id),
+                                                    (REDString, working_directory_string_id)])
 
         self._executable        = executable
         self._arguments         = arguments
@@ -1397,9 +1829,9 @@ class REDProcess(REDObject):
         if error_code != REDError.E_SUCCESS:
             raise REDError('Could not get stdio of process object {0}'.format(self.object_id), error_code)
 
-        stdin  = _attach_or_release(self._session, REDFile, stdin_file_id, [stdout_file_id, stderr_file_id])
-        stdout = _attach_or_release(self._session, REDFile, stdout_file_id, [stderr_file_id])
-        stderr = _attach_or_release(self._session, REDFile, stderr_file_id)
+        stdin, stdout, stderr = _attach_or_release_many(self._session, [(REDFile, stdin_file_id),
+                                                                        (REDFile, stdout_file_id),
+                                                                        (REDFile, stderr_file_id)])
 
         self._stdin  = stdin
         self._stdout = stdout
@@ -1426,17 +1858,8 @@ class REDProcess(REDObject):
               uid, gid, stdin, stdout, stderr):
         self.release()
 
-        if not isinstance(executable, REDString):
-            executable = REDString(self._session).allocate(executable)
-
-        if not isinstance(arguments, REDList):
-            arguments = REDList(self._session).allocate(arguments)
-
-        if not isinstance(environment, REDList):
-            environment = REDList(self._session).allocate(environment)
-
-        if not isinstance(working_directory, REDString):
-            working_directory = REDString(self._session).allocate(working_directory)
+        executable, arguments, environment, working_directory = \
+            _allocate_batch(self._session, [executable, arguments, environment, working_directory])
 
         try:
             error_code, object_id = self._session._brick.spawn_process(executable.object_id,
@@ -1560,22 +1983,44 @@ class REDProgramBase(REDObject):
             raise REDError('Could not get list of custom option names of program object {0}'.format(self.object_id), error_code)
 
         custom_option_names = _attach_or_release(self._session, REDList, custom_option_names_list_id)
-        custom_options      = {}
 
-        for name in custom_option_names._items:
-            try:
-                error_code, custom_option_value_string_id = \
-                self._session._brick.get_custom_program_option_value(self.object_id, name.object_id, self._session._session_id)
-            except Error:
-                self._session.increase_error_count()
-                raise
+        # get all value string IDs first and then attach them all at once, this
+        # creates all value objects with a single trip to the Qt main thread
+        brick                          = self._session._brick
+        session_id                     = self._session._session_id
+        object_id                      = self.object_id
+        e_success                      = REDError.E_SUCCESS
+        custom_option_value_string_ids = []
 
-            if error_code != REDError.E_SUCCESS:
-                raise REDError('Could not get custom option value of program object {0}'.format(self.object_id), error_code)
+        try:
+            for name in custom_option_names._items:
+                try:
+                    error_code, custom_option_value_string_id = \
+                    brick.get_custom_program_option_value(object_id, name.object_id, session_id)
+                except Error:
+                    self._session.increase_error_count()
+                    raise
+
+                if error_code != e_success:
+                    raise REDError('Could not get custom option value of program object {0}'.format(object_id), error_code)
+
+                custom_option_value_string_ids.append(custom_option_value_string_id)
+        except:
+            _release_unchecked(self._session, custom_option_value_string_ids)
+
+            raise # just re-raise the original exception
 
-            custom_options[unicode(name)] = _attach_or_release(self._session, REDString, custom_option_value_string_id)
+        values = _attach_or_release_many(self._session, [(REDString, value_string_id) for value_string_id in custom_option_value_string_ids])
 
-        self._custom_options = custom_options
+        self._custom_options = {unicode(name): value for name, value in zip(custom_option_names._items, values)}
+
+    # custom options of objects that don't get them in update() are loaded on
+    # first use
+    def _get_custom_options(self):
+        if self._custom_options is None:
+            self.update_custom_options()
+
+        return self._custom_options
 
     def set_custom_option_value(self, name, value):
         if self.object_id is None:
@@ -1584,8 +2029,7 @@ class REDProgramBase(REDObject):
         if isinstance(value, list):
             self.set_custom_option_value_list(name, value)
         else:
-            if not isinstance(name, REDString):
-                name = REDString(self._session).allocate(name)
+            name = _get_cached_red_string(self._session, name)
 
             if isinstance(value, bool):
                 if value:
@@ -1593,8 +2037,7 @@ class REDProgramBase(REDObject):
                 else:
                     value = 'false'
 
-            if not isinstance(value, REDString):
-                value = REDString(self._session).allocate(value)
+            value = _get_cached_red_string(self._session, value)
 
             try:
                 error_code = self._session._brick.set_custom_program_option_value(self.object_id, name.object_id, value.object_id)
@@ -1605,7 +2048,7 @@ class REDProgramBase(REDObject):
             if error_code != REDError.E_SUCCESS:
                 raise REDError('Could not set custom option for program object {0}'.format(self.object_id), error_code)
 
-            self._custom_options[unicode(name)] = value
+            self._get_custom_options()[unicode(name)] = value
 
     def set_custom_option_value_list(self, name, values):
         if self.object_id is None:
@@ -1620,20 +2063,22 @@ class REDProgramBase(REDObject):
 
     def cast_custom_option_value(self, name, cast, default):
         try:
-            string = self._custom_options[unicode(name)]
+            # the values are REDStrings that were read on attach, use their
+            # text directly instead of going through unicode()
+            string = self._get_custom_options()[unicode(name)]._data
         except KeyError:
             return default
 
         if cast == bool:
-            if unicode(string) == 'true':
+            if string == 'true':
                 return True
-            elif unicode(string) == 'false':
+            elif string == 'false':
                 return False
             else:
                 return default
         else:
             try:
-                return cast(unicode(string))
+                return cast(string)
             except ValueError:
                 return default
 
@@ -1714,28 +2159,33 @@ class REDProgram(REDProgramBase):
 
     def _attach_callbacks(self):
         self._qtcb_scheduler_state_changed.connect(self._cb_scheduler_state_changed, QtCore.Qt.QueuedConnection)
-        self._cb_scheduler_state_changed_emit_cookie = self._session._brick.add_callback(BrickRED.CALLBACK_PROGRAM_SCHEDULER_STATE_CHANGED,
-                                                                                          self._cb_scheduler_state_changed_emit)
+        self._cb_scheduler_state_changed_emit_cookie = self._session._brick.add_object_callback(BrickRED.CALLBACK_PROGRAM_SCHEDULER_STATE_CHANGED,
+                                                                                                 self.object_id,
+                                                                                                 self._cb_scheduler_state_changed_emit)
 
         self._qtcb_process_spawned.connect(self._cb_process_spawned, QtCore.Qt.QueuedConnection)
-        self._cb_process_spawned_emit_cookie = self._session._brick.add_callback(BrickRED.CALLBACK_PROGRAM_PROCESS_SPAWNED,
-                                                                                 self._cb_process_spawned_emit)
+        self._cb_process_spawned_emit_cookie = self._session._brick.add_object_callback(BrickRED.CALLBACK_PROGRAM_PROCESS_SPAWNED,
+                                                                                        self.object_id,
+                                                                                        self._cb_process_spawned_emit)
 
     def _detach_callbacks(self):
         self._qtcb_scheduler_state_changed.disconnect(self._cb_scheduler_state_changed)
-        self._session._brick.remove_callback(BrickRED.CALLBACK_PROGRAM_SCHEDULER_STATE_CHANGED,
-                                             self._cb_scheduler_state_changed_emit_cookie)
+        self._session._brick.remove_object_callback(BrickRED.CALLBACK_PROGRAM_SCHEDULER_STATE_CHANGED,
+                                                    self.object_id,
+                                                    self._cb_scheduler_state_changed_emit_cookie)
 
         self._qtcb_process_spawned.disconnect(self._cb_process_spawned)
-        self._session._brick.remove_callback(BrickRED.CALLBACK_PROGRAM_PROCESS_SPAWNED,
-                                             self._cb_process_spawned_emit_cookie)
+        self._session._brick.remove_object_callback(BrickRED.CALLBACK_PROGRAM_PROCESS_SPAWNED,
+                                                    self.object_id,
+                                                    self._cb_process_spawned_emit_cookie)
 
 
         self._cb_scheduler_state_changed_emit_cookie = None
         self._cb_process_spawned_emit_cookie         = None
 
+    # only called for this program, REDBrick routes the callback by object ID
     def _cb_scheduler_state_changed_emit(self, program_id):
-        if not self.enable_callbacks or self.object_id != program_id:
+        if not self.enable_callbacks:
             return
 
         # cannot directly use emit function as callback functions, because this
@@ -1755,7 +2205,7 @@ class REDProgram(REDProgramBase):
 
         try:
             message = _attach_or_release(self._session, REDString, message_string_id)
-        except:
+        except (Error, REDError):
             message = None
 
         self._scheduler_state     = state
@@ -1771,7 +2221,7 @@ class REDProgram(REDProgramBase):
             scheduler_state_changed_callback(self)
 
     def _cb_process_spawned_emit(self, program_id):
-        if not self.enable_callbacks or self.object_id != program_id:
+        if not self.enable_callbacks:
             return
 
         # cannot directly use emit function as callback functions, because this
@@ -1791,7 +2241,7 @@ class REDProgram(REDProgramBase):
 
         try:
             process = _attach_or_release(self._session, REDProcess, process_id)
-        except:
+        except (Error, REDError):
             process = None
 
         self._last_spawned_process   = process
@@ -1847,10 +2297,11 @@ class REDProgram(REDProgramBase):
         if error_code != REDError.E_SUCCESS:
             raise REDError('Could not get command of program object {0}'.format(self.object_id), error_code)
 
-        executable        = _attach_or_release(self._session, REDString, executable_string_id, [arguments_list_id, environment_list_id, working_directory_string_id])
-        arguments         = _attach_or_release(self._session, REDList, arguments_list_id, [environment_list_id, working_directory_string_id])
-        environment       = _attach_or_release(self._session, REDList, environment_list_id, [working_directory_string_id])
-        working_directory = _attach_or_release(self._session, REDString, working_directory_string_id)
+        executable, arguments, environment, working_directory = \
+            _attach_or_release_many(self._session, [(REDString, executable_string_id),
+                                                    (REDList, arguments_list_id),
+                                                    (REDList, environment_list_id),
+                                                    (REDString, working_directory_string_id)])
 
         self._executable        = executable
         self._arguments         = arguments
@@ -1985,8 +2436,7 @@ class REDProgram(REDProgramBase):
     def define(self, identifier):
         self.release()
 
-        if not isinstance(identifier, REDString):
-            identifier = REDString(self._session).allocate(identifier)
+        identifier = _get_cached_red_string(self._session, identifier)
 
         try:
             error_code, object_id = self._session._brick.define_program(identifier.object_id,
@@ -2006,10 +2456,7 @@ class REDProgram(REDProgramBase):
         if self.object_id is None:
             raise RuntimeError('Cannot purge unattached program object')
 
-        cookie = 0
-
-        for c in str(self._identifier):
-            cookie += ord(c)
+        cookie = sum(bytearray(str(self._identifier)))
 
         try:
             error_code = self._session._brick.purge_program(self.object_id, cookie)
@@ -2024,17 +2471,8 @@ class REDProgram(REDProgramBase):
         if self.object_id is None:
             raise RuntimeError('Cannot set command for unattached program object')
 
-        if not isinstance(executable, REDString):
-            executable = REDString(self._session).allocate(executable)
-
-        if not isinstance(arguments, REDList):
-            arguments = REDList(self._session).allocate(arguments)
-
-        if not isinstance(environment, REDList):
-            environment = REDList(self._session).allocate(environment)
-
-        if not isinstance(working_directory, REDString):
-            working_directory = REDString(self._session).allocate(working_directory)
+        executable, arguments, environment, working_directory = \
+            _allocate_batch(self._session, [executable, arguments, environment, working_directory])
 
         try:
             error_code = self._session._brick.set_program_command(self.object_id,
@@ -2060,35 +2498,13 @@ class REDProgram(REDProgramBase):
         if self.object_id is None:
             raise RuntimeError('Cannot set stdio redirection for unattached program object')
 
-        # stdin
-        if stdin_redirection == REDProgram.STDIO_REDIRECTION_FILE:
-            if not isinstance(stdin_file_name, REDString):
-                stdin_file_name = REDString(self._session).allocate(stdin_file_name)
-
-            stdin_file_name_object_id = stdin_file_name.object_id
-        else:
-            stdin_file_name           = None
-            stdin_file_name_object_id = 0
-
-        # stdout
-        if stdout_redirection == REDProgram.STDIO_REDIRECTION_FILE:
-            if not isinstance(stdout_file_name, REDString):
-                stdout_file_name = REDString(self._session).allocate(stdout_file_name)
-
-            stdout_file_name_object_id = stdout_file_name.object_id
-        else:
-            stdout_file_name           = None
-            stdout_file_name_object_id = 0
-
-        # stderr
-        if stderr_redirection == REDProgram.STDIO_REDIRECTION_FILE:
-            if not isinstance(stderr_file_name, REDString):
-                stderr_file_name = REDString(self._session).allocate(stderr_file_name)
-
-            stderr_file_name_object_id = stderr_file_name.object_id
-        else:
-            stderr_file_name           = None
-            stderr_file_name_object_id = 0
+        (stdin_file_name, stdin_file_name_object_id), \
+        (stdout_file_name, stdout_file_name_object_id), \
+        (stderr_file_name, stderr_file_name_object_id) = \
+            [_get_optional_red_string(self._session, redirection == REDProgram.STDIO_REDIRECTION_FILE, file_name)
+             for redirection, file_name in ((stdin_redirection, stdin_file_name),
+                                            (stdout_redirection, stdout_file_name),
+                                            (stderr_redirection, stderr_file_name))]
 
         try:
             error_code = self._session._brick.set_program_stdio_redirection(self.object_id,
@@ -2116,14 +2532,9 @@ class REDProgram(REDProgramBase):
         if self.object_id is None:
             raise RuntimeError('Cannot set schedule for unattached program object')
 
-        if start_mode == REDProgram.START_MODE_CRON:
-            if not isinstance(start_fields, REDString):
-                start_fields = REDString(self._session).allocate(start_fields)
-
-            start_fields_object_id = start_fields.object_id
-        else:
-            start_fields           = None
-            start_fields_object_id = 0
+        start_fields, start_fields_object_id = _get_optional_red_string(self._session,
+                                                                        start_mode == REDProgram.START_MODE_CRON,
+                                                                        start_fields)
 
         try:
             error_code = self._session._brick.set_program_schedule(self.object_id,
@@ -2169,46 +2580,35 @@ class REDProgram(REDProgramBase):
         if error_code != REDError.E_SUCCESS:
             raise REDError('Could not start program object {0} now'.format(self.object_id), error_code)
 
+    # plain attribute getters use attrgetter to avoid a Python call per access
     @property
     def root_directory(self):         return _red_string_to_unicode(self._root_directory)
     @property
     def executable(self):             return _red_string_to_unicode(self._executable)
-    @property
-    def arguments(self):              return self._arguments
-    @property
-    def environment(self):            return self._environment
+    arguments              = property(attrgetter('_arguments'))
+    environment            = property(attrgetter('_environment'))
     @property
     def working_directory(self):      return _red_string_to_unicode(self._working_directory)
-    @property
-    def stdin_redirection(self):      return self._stdin_redirection
+    stdin_redirection      = property(attrgetter('_stdin_redirection'))
     @property
     def stdin_file_name(self):        return _red_string_to_unicode(self._stdin_file_name)
-    @property
-    def stdout_redirection(self):     return self._stdout_redirection
+    stdout_redirection     = property(attrgetter('_stdout_redirection'))
     @property
     def stdout_file_name(self):       return _red_string_to_unicode(self._stdout_file_name)
-    @property
-    def stderr_redirection(self):     return self._stderr_redirection
+    stderr_redirection     = property(attrgetter('_stderr_redirection'))
     @property
     def stderr_file_name(self):       return _red_string_to_unicode(self._stderr_file_name)
-    @property
-    def start_mode(self):             return self._start_mode
-    @property
-    def continue_after_error(self):   return self._continue_after_error
-    @property
-    def start_interval(self):         return self._start_interval
+    start_mode             = property(attrgetter('_start_mode'))
+    continue_after_error   = property(attrgetter('_continue_after_error'))
+    start_interval         = property(attrgetter('_start_interval'))
     @property
     def start_fields(self):           return _red_string_to_unicode(self._start_fields)
-    @property
-    def scheduler_state(self):        return self._scheduler_state
-    @property
-    def scheduler_timestamp(self):    return self._scheduler_timestamp
+    scheduler_state        = property(attrgetter('_scheduler_state'))
+    scheduler_timestamp    = property(attrgetter('_scheduler_timestamp'))
     @property
     def scheduler_message(self):      return _red_string_to_unicode(self._scheduler_message)
-    @property
-    def last_spawned_process(self):   return self._last_spawned_process
-    @property
-    def last_spawned_timestamp(self): return self._last_spawned_timestamp
+    last_spawned_process   = property(attrgetter('_last_spawned_process'))
+    last_spawned_timestamp = property(attrgetter('_last_spawned_timestamp'))
 
 
 class REDSimpleProgram(REDProgramBase):
@@ -2221,9 +2621,10 @@ class REDSimpleProgram(REDProgramBase):
     def _detach_callbacks(self):
         pass
 
+    # custom options are only needed by some users of simple programs, don't
+    # get them unless they are used
     def update(self):
         self.update_identifier()
-        self.update_custom_options()
 
 
 def get_programs(session):
@@ -2252,11 +2653,16 @@ def get_simple_programs(session):
     return _attach_or_release(session, REDList, programs_list_id, extra_parameters=(REDSimpleProgram,)).items
 
 
-REDObject._subclasses = {
+# the object types are small consecutive integers starting at 0, index a tuple
+# by them instead of looking them up in a dict
+def _get_subclasses_by_type(subclasses):
+    return tuple(subclasses[type_] for type_ in range(len(subclasses)))
+
+REDObject._subclasses = _get_subclasses_by_type({
     REDObject.TYPE_STRING:    REDString,
     REDObject.TYPE_LIST:      REDList,
     REDObject.TYPE_FILE:      REDFileOrPipeAttacher,
     REDObject.TYPE_DIRECTORY: REDDirectory,
     REDObject.TYPE_PROCESS:   REDProcess,
     REDObject.TYPE_PROGRAM:   REDProgram
-}
+})
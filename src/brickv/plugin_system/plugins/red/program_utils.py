@@ -1139,6 +1139,8 @@ class ChunkedDownloaderBase(object):
 
         self.remaining_source_size -= len(result.data)
 
+        REDFile.recycle_read_buffer(result.data)
+
         if self.remaining_source_size > 0:
             self.download_read_async()
         else:
@@ -1172,7 +1174,8 @@ class ChunkedDownloaderBase(object):
         try:
             self.source_file.read_async(min(self.remaining_source_size, 1000*1000*10), # Read 10mb at a time
                                         self.download_read_async_cb_result,
-                                        self.download_read_async_cb_status)
+                                        self.download_read_async_cb_status,
+                                        use_buffer_pool=True)
         except (Error, REDError) as e:
             self.report_error('Could not read from source file {0}: {1}', self.source_path, e)
 
@@ -1180,6 +1183,8 @@ class ChunkedDownloaderBase(object):
         self.target_file.close()
         self.target_file = None
 
+        REDFile.release_unused_read_buffers()
+
         if self.canceled:
             try:
                 os.remove(self.target_path)
@@ -116,7 +116,13 @@ class REDTabImportExportExport(QWidget, Ui_REDTabImportExportExport):
 
     def refresh_program_list(self):
         def refresh_async():
-            return get_simple_programs(self.session)
+            programs = get_simple_programs(self.session)
+
+            # get custom options here instead of on first use in the Qt main thread
+            for program in programs:
+                program.update_custom_options()
+
+            return programs
 
         def cb_success(programs):
             sorted_programs = {}